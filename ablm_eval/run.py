@@ -5,6 +5,7 @@ from pathlib import Path
 import torch
 
 from .utils.directories import create_results_dir
+from .utils.load_model import clear_model_cache
 from .tasks.compare_registry import (
     _config_from_json,
     _comparer_from_str,
@@ -17,6 +18,15 @@ BOLD = "\033[1m"
 UNDERLINE = "\033[4m"
 RESET = "\033[0m"
 
+# tasks that run inference with an MLM model, which is cached between them
+MLM_TASKS = {
+    "inference",
+    "per_pos_inference",
+    "mutation_prediction",
+    "naturalness",
+    "routing_analysis",
+}
+
 
 def compare_task(
     task_type: str, task_results_dir: str, output_dir: Optional[str] = None
@@ -77,6 +87,11 @@ def _clean_up():
 
 def _eval_model(model_name: str, model_path: str, configs: list):
     for itr, config in enumerate(configs, 1):
+        # release the cached model (and its GPU memory) before other tasks
+        if config.config_type not in MLM_TASKS:
+            clear_model_cache()
+            _clean_up()
+
         # run task
         print(f"{UNDERLINE}Running Task #{itr}: {config.name}{RESET}")
         task_fn = config.runner
@@ -85,6 +100,10 @@ def _eval_model(model_name: str, model_path: str, configs: list):
         # clean up memory
         _clean_up()
 
+    # release the model cached across this model's tasks
+    clear_model_cache()
+    _clean_up()
+
 
 def evaluate_ablms(
     models: dict,
@@ -179,3 +179,12 @@ class ClassificationConfig(BaseTaskConfig):
 
     # # output
     # output_dir: str = None
+
+    def __post_init__(self):
+        # classification models are always fine-tuned in float32
+        # (mixed precision is controlled by `bf16` & `fp16`)
+        if self.torch_dtype is not None:
+            raise ValueError(
+                "`torch_dtype` is not supported for classification "
+                "(use `bf16` or `fp16` for mixed precision training)."
+            )
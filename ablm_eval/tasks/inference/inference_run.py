@@ -14,7 +14,10 @@ __all__ = ["run_inference"]
 def run_inference(model_name: str, model_path: str, config: InferenceConfig):
     # load model & tokenizer
     model, tokenizer = load_model_and_tokenizer(
-        model_path, task="mlm", tokenizer_path=config.tokenizer_path
+        model_path,
+        task="mlm",
+        tokenizer_path=config.tokenizer_path,
+        torch_dtype=config.torch_dtype,
     )
     model.eval()
 
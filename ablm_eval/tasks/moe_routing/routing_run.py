@@ -165,7 +165,10 @@ def _tensor_to_python(obj):
 def run_routing_analysis(model_name: str, model_path: str, config: RoutingConfig):
     # load model & tokenizer
     model, tokenizer = load_model_and_tokenizer(
-        model_path, task="mlm", tokenizer_path=config.tokenizer_path
+        model_path,
+        task="mlm",
+        tokenizer_path=config.tokenizer_path,
+        torch_dtype=config.torch_dtype,
     )
     model = model.to(device)
     model.eval()
@@ -33,7 +33,9 @@ def _inference_batched(model, tokenizer, input_ids):
     # inference
     with torch.no_grad():
         outputs = model(input_ids=masked_inputs, labels=labels)
-        logits = outputs.logits
+        # softmax & cross-entropy are computed in float32, but the logits
+        # themselves keep the precision the model was loaded in
+        logits = outputs.logits.float()
 
         # calculate loss and perplexity
         ce_loss = F.cross_entropy(
@@ -68,7 +70,10 @@ def run_per_pos(
 ):
     # load model & tokenizer
     model, tokenizer = load_model_and_tokenizer(
-        model_path, task="mlm", tokenizer_path=config.tokenizer_path
+        model_path,
+        task="mlm",
+        tokenizer_path=config.tokenizer_path,
+        torch_dtype=config.torch_dtype,
     )
     model = model.to(device)
     if torch.cuda.device_count() > 1:
@@ -89,9 +94,11 @@ def run_per_pos(
             input_ids=torch.tensor(example["input_ids"]),
         )
         # merge results with reference df
+        # (heavy chain & separator lengths are stored to simplify splitting chains)
         combined = {
             "model": model_name,
             "separator": config.separator,
+            "sep_len": config.separator.count("<"),
             **{
                 k: v
                 for k, v in example.items()
@@ -99,6 +106,8 @@ def run_per_pos(
             },
             **result,
         }
+        if "cdr_mask_heavy" in example:
+            combined["heavy_len"] = len(example["cdr_mask_heavy"])
         results.append(combined)
 
     # save results
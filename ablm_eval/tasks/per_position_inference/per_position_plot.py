@@ -2,6 +2,7 @@ from pathlib import Path
 
 import pandas as pd
 import numpy as np
+import pyarrow.dataset as ds
 import seaborn as sns
 import matplotlib.pyplot as plt
 
@@ -10,106 +11,179 @@ __all__ = ["per_pos_compare"]
 
 REGIONS = ["FR1", "CDR1", "FR2", "CDR2", "FR3", "CDR3", "FR4"]
 
+# result columns used in the comparison
+RESULT_COLUMNS = [
+    "model",
+    "separator",
+    "sequence",
+    "cdr_mask_heavy",
+    "cdr_mask_light",
+    "v_mutation_count_aa_heavy",
+    "v_mutation_count_aa_light",
+    "loss",
+    "prediction",
+]
+
+# lengths stored by per-position inference (absent from older results)
+LENGTH_COLUMNS = ["heavy_len", "sep_len"]
+
 
 def _extract(df):
-    h_loss = []
-    l_loss = []
-    h_pred = []
-    l_pred = []
-    h_seq = []
-    l_seq = []
-
-    for _, r in df.iterrows():
-        hlen = len(r["cdr_mask_heavy"])
-        sep = r["separator"]
+    # results typically share a single separator, in which case
+    # separator length & sequence splits are computed once for all rows
+    separators = df["separator"].unique()
+    if len(separators) == 1:
+        sep = separators[0]
         seplen = sep.count("<")
-
-        h_loss.append(r["loss"][:hlen])
-        l_loss.append(r["loss"][(hlen + seplen) :])
-        h_pred.append(r["prediction"][:hlen])
-        l_pred.append(r["prediction"][(hlen + seplen) :])
-        h_seq.append(r["sequence"].split(sep)[0])
-        l_seq.append(r["sequence"].split(sep)[1])
-
-    df["heavy_loss"] = h_loss
-    df["light_loss"] = l_loss
-    df["heavy_pred"] = h_pred
-    df["light_pred"] = l_pred
+        seqs = df["sequence"].str.split(sep, n=1, expand=True, regex=False)
+        h_seq, l_seq = seqs[0], seqs[1]
+    else:
+        seplen = df["separator"].str.count("<").values
+        seqs = [s.split(sep, 1) for s, sep in zip(df["sequence"], df["separator"])]
+        h_seq = [s[0] for s in seqs]
+        l_seq = [s[1] for s in seqs]
+
+    # heavy chain length & start of light chain
+    # (read from stored lengths, when available for all results)
+    has_lengths = set(LENGTH_COLUMNS).issubset(df.columns)
+    if has_lengths and df[LENGTH_COLUMNS].notna().all(axis=None):
+        hlen = df["heavy_len"].to_numpy(dtype=np.int64)
+        seplen = df["sep_len"].to_numpy(dtype=np.int64)
+    else:
+        hlen = df["cdr_mask_heavy"].str.len().values
+    lstart = hlen + seplen
+
+    # split loss & predictions by chain
+    loss = df["loss"].values
+    pred = df["prediction"].values
+    df["heavy_loss"] = [l[:h] for l, h in zip(loss, hlen)]
+    df["light_loss"] = [l[s:] for l, s in zip(loss, lstart)]
+    df["heavy_pred"] = [p[:h] for p, h in zip(pred, hlen)]
+    df["light_pred"] = [p[s:] for p, s in zip(pred, lstart)]
+
+    # split sequences by chain
     df["heavy_sequence"] = h_seq
     df["light_sequence"] = l_seq
 
     return df
 
 
+def _chain_positions(df, chain):
+    masks = df[f"cdr_mask_{chain}"].values
+    lengths = np.fromiter((len(m) for m in masks), dtype=np.int64, count=len(masks))
+    offsets = np.cumsum(lengths) - lengths
+
+    # a region starts wherever the mask character changes,
+    # as well as at the start of every sequence
+    mask = np.frombuffer("".join(masks).encode(), dtype=np.uint8)
+    is_start = np.ones(len(mask), dtype=bool)
+    is_start[1:] = mask[1:] != mask[:-1]
+    is_start[offsets] = True
+
+    # skip any sequences w/o 6 CDRs, or with per-position values shorter
+    # than the mask (e.g., sequences truncated during tokenization)
+    losses = df[f"{chain}_loss"].values
+    preds = df[f"{chain}_pred"].values
+    seqs = df[f"{chain}_sequence"].values
+    min_lengths = np.fromiter(
+        (min(len(l), len(p), len(s)) for l, p, s in zip(losses, preds, seqs)),
+        dtype=np.int64,
+        count=len(masks),
+    )
+    n_starts = np.add.reduceat(is_start, offsets, dtype=np.int64)
+    keep = (n_starts == len(REGIONS)) & (min_lengths >= lengths)
+    keep_pos = np.repeat(keep, lengths)
+
+    kept = np.flatnonzero(keep)
+    if not len(kept):
+        return {
+            "keep": keep,
+            "loss": np.empty(0, dtype=np.float64),
+            "match": np.empty(0, dtype=bool),
+            "is_start": np.empty(0, dtype=bool),
+        }
+
+    # flatten per-position values of kept sequences, trimmed to the mask length
+    loss = np.concatenate([losses[i][: lengths[i]] for i in kept]).astype(np.float64)
+    pred = np.concatenate([preds[i][: lengths[i]] for i in kept])
+    seq = "".join(seqs[i][: lengths[i]] for i in kept)
+
+    # compare predicted & true residues as character codes
+    # (special tokens, like <unk>, are truncated to "<" and never match)
+    pred_codes = pred.astype("U1").view(np.uint32)
+    seq_codes = np.frombuffer(seq.encode(), dtype=np.uint8)
+    match = pred_codes == seq_codes
+
+    return {
+        "keep": keep,
+        "loss": loss,
+        "match": match,
+        "is_start": is_start[keep_pos],
+    }
+
+
 def _region_processing(df):
+    # per-sequence labels, shared by both chains
+    models = df["model"].values
+    mutated = (
+        df["v_mutation_count_aa_heavy"].astype(bool).values
+        | df["v_mutation_count_aa_light"].astype(bool).values
+    )
 
-    data = []
-    for _, r in df.iterrows():
-        mutated = bool(r["v_mutation_count_aa_heavy"] or r["v_mutation_count_aa_light"])
-        model = r["model"]
-
-        # for both chains separately
-        for chain in ["heavy", "light"]:
-            loss = r[f"{chain}_loss"]
-            pred = r[f"{chain}_pred"]
-            seq = list(r[f"{chain}_sequence"])
-            cdr_mask = r[f"cdr_mask_{chain}"]
-
-            # find regions
-            mask_segments = []
-            prev_char = cdr_mask[0]
-            start_idx = 0
-
-            for i, char in enumerate(cdr_mask):
-                if char != prev_char:  # region change
-                    mask_segments.append((start_idx, i))
-                    start_idx = i
-                prev_char = char
-            mask_segments.append((start_idx, len(cdr_mask)))  # final region
-
-            # skip any sequences w/o 6 CDRs
-            if len(mask_segments) != len(REGIONS):
-                continue
-
-            # extract by region
-            for region, (start, end) in zip(REGIONS, mask_segments):
-                region_loss = loss[start:end]
-                region_pred = pred[start:end]
-                region_seq = seq[start:end]
-
-                data.append(
-                    {
-                        "region": region,
-                        "model": model,
-                        "chain": chain,
-                        "mutated": mutated,
-                        "loss": region_loss,
-                        "mean_loss": np.mean(region_loss),
-                        "median_loss": np.median(region_loss),
-                        "accuracy": np.mean(
-                            [p == t for p, t in zip(region_pred, region_seq)]
-                        ),
-                    }
-                )
-
-    return data
-
-
-def _per_pos_boxenplot(
-    df: pd.DataFrame,
-    y_axis: str,
-    output_dir: str,
-    task_str: str,
-    plot_desc: str,
-):
-    fig, ax = plt.subplots(2, 1, figsize=(8, 6), sharex=True)
+    # flatten per-position values of all (sequence, chain) pairs
+    heavy = _chain_positions(df, "heavy")
+    light = _chain_positions(df, "light")
+    n_heavy, n_light = heavy["keep"].sum(), light["keep"].sum()
+
+    loss = np.concatenate([heavy["loss"], light["loss"]])
+    match = np.concatenate([heavy["match"], light["match"]]).astype(np.int64)
+    starts = np.flatnonzero(np.concatenate([heavy["is_start"], light["is_start"]]))
+
+    # per-region stats, computed in bulk
+    counts = np.diff(np.append(starts, len(loss)))
+    region_ids = np.repeat(np.arange(len(starts)), counts)
+
+    n_regions = len(REGIONS)
+    data_df = pd.DataFrame(
+        {
+            "region": np.tile(REGIONS, n_heavy + n_light),
+            "model": np.repeat(
+                np.concatenate([models[heavy["keep"]], models[light["keep"]]]),
+                n_regions,
+            ),
+            "chain": np.repeat(
+                ["heavy", "light"], [n_heavy * n_regions, n_light * n_regions]
+            ),
+            "mutated": np.repeat(
+                np.concatenate([mutated[heavy["keep"]], mutated[light["keep"]]]),
+                n_regions,
+            ),
+            "loss": np.split(loss, starts[1:]),
+            "mean_loss": np.add.reduceat(loss, starts) / counts,
+            "median_loss": pd.Series(loss).groupby(region_ids).median().values,
+            "accuracy": np.add.reduceat(match, starts) / counts,
+        }
+    )
+
+    # categorical labels keep memory low & speed up grouping/plotting
+    # (model is kept as strings, since seaborn misplaces boxes for a
+    # categorical hue whose rows aren't in hue_order)
+    return data_df.astype(
+        {
+            "chain": "category",
+            "region": pd.CategoricalDtype(REGIONS, ordered=True),
+            "mutated": "bool",
+        }
+    )
 
-    model_order = sorted(df["model"].unique())
+
+def _per_pos_boxenplot(chain_dfs: dict, model_order: list, y_axis: str):
+    fig, ax = plt.subplots(2, 1, figsize=(8, 6), sharex=True)
 
     for i, chain in enumerate(["heavy", "light"]):
         # boxplot
         sns.boxenplot(
-            data=df[(df["chain"] == chain)],
+            data=chain_dfs[chain],
             x="region",
             y=y_axis,
             hue="model",
@@ -147,32 +221,27 @@ def _per_pos_boxenplot(
         title="Model",
     )
 
-    plt.tight_layout()
-    plt.savefig(
-        f"./{output_dir}/combined-{task_str}-results_{plot_desc}.png",
-        bbox_inches="tight",
-        dpi=300,
-    )
+    fig.tight_layout()
+    return fig
 
 
 def _summary_df(df):
     # filter for CDR3 only
-    cdr3_df = df[(df["region"] == "CDR3") & (df["chain"] ==  "heavy")].drop(columns="mean_loss")
-
-    # group by model, chain, mutated
-    means = cdr3_df.groupby(['model', 'mutated']).median(numeric_only=True)
-    sems = cdr3_df.groupby(['model', 'mutated']).sem(numeric_only=True)
+    cdr3_df = df[(df["region"] == "CDR3") & (df["chain"] ==  "heavy")]
 
-    # format mean ± sem
-    def format_value(mean, sem):
-        if pd.notna(sem):
-            return f"{mean:.4f} (± {sem:.4f})"
-        return f"{mean:.4f}"
+    # group by model, mutated (median & sem in a single pass)
+    stats = cdr3_df.groupby(['model', 'mutated'], observed=True)[
+        ['median_loss', 'accuracy']
+    ].agg(['median', 'sem'])
+    means = stats.xs('median', axis=1, level=1)
+    sems = stats.xs('sem', axis=1, level=1)
 
-    # combine
+    # combine, formatted as mean ± sem (sem is omitted when undefined)
     combined = pd.DataFrame(index=means.index)
     for col in means.columns:
-        combined[f"CDRH3_{col}"] = means[col].combine(sems[col], format_value)
+        mean_str = means[col].map("{:.4f}".format)
+        sem_str = " (± " + sems[col].map("{:.4f}".format) + ")"
+        combined[f"CDRH3_{col}"] = mean_str + sem_str.where(sems[col].notna(), "")
 
     # make model & mutated columns non-index cols
     combined = combined.reset_index()
@@ -184,25 +253,37 @@ def _summary_df(df):
 
 def per_pos_compare(results_dir, output_dir, task_str, **kwargs):
     # load & concat results
-    files = list(Path(results_dir).glob("*.parquet"))
-    results = pd.concat([pd.read_parquet(file) for file in files], ignore_index=True)
+    # (files are read in parallel by arrow's threadpool, and
+    # only the columns needed are read & decompressed)
+    files = [str(file) for file in Path(results_dir).glob("*.parquet")]
+    dataset = ds.dataset(files, format="parquet")
+    columns = RESULT_COLUMNS + [
+        col for col in LENGTH_COLUMNS if col in dataset.schema.names
+    ]
+    table = dataset.to_table(columns=columns, use_threads=True)
+    # (converted in one pass, freeing arrow buffers as each column is converted)
+    results = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
 
     # process results
     results = _extract(results)
-    data = _region_processing(results)
-    data_df = pd.DataFrame(data)
+    data_df = _region_processing(results)
 
     # plots
-    for mutated in [True, False]:
-        df = data_df[(data_df["mutated"] == mutated)]
+    # (data is split by mutation status & chain once, and reused across metrics;
+    # each plot summarizes a distinct metric/subset, so boxen stats aren't shared)
+    for mutated, df in data_df.groupby("mutated"):
+        chain_dfs = dict(tuple(df.groupby("chain", observed=True)))
+        model_order = sorted(df["model"].unique())
         for metric in ["median_loss", "accuracy"]:
-            _per_pos_boxenplot(
-                df,
-                y_axis=metric,
-                output_dir=output_dir,
-                task_str=task_str,
-                plot_desc=f"{'mutated' if mutated else 'unmutated'}_{metric}",
+            fig = _per_pos_boxenplot(chain_dfs, model_order, y_axis=metric)
+            plot_desc = f"{'mutated' if mutated else 'unmutated'}_{metric}"
+            fig.savefig(
+                f"./{output_dir}/combined-{task_str}-results_{plot_desc}.png",
+                bbox_inches="tight",
+                dpi=300,
             )
+            plt.close(fig)
 
     summary_df = _summary_df(data_df)
     summary_df.to_csv(f"{output_dir}/results-summary_{task_str}.csv", index=False)
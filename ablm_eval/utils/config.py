@@ -45,5 +45,8 @@ class BaseTaskConfig(ABC):
     num_proc: int = 128
     # keep_columns: list = field(default_factory=list)
 
+    # Model properties
+    torch_dtype: str | None = None  # eg. "float32", defaults to bfloat16 on supported GPUs
+
     # Output
     output_dir: str = None
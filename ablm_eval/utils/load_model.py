@@ -1,32 +1,109 @@
-from balm import *  # needed to load custom balm models & tokenizer
+from functools import lru_cache
+
+import torch
+import balm  # noqa: F401 (registers custom balm models & tokenizer with transformers)
 from transformers import (
     AutoModelForMaskedLM,
     AutoModelForSequenceClassification,
     AutoTokenizer,
 )
 
-__all__ = ["load_model_and_tokenizer"]
+__all__ = ["load_model_and_tokenizer", "clear_model_cache"]
 
 
 def load_model_and_tokenizer(
-    model_path: str, task: str, tokenizer_path: str | None = None, **kwargs
+    model_path: str,
+    task: str,
+    tokenizer_path: str | None = None,
+    torch_dtype: torch.dtype | str | None = None,
+    **kwargs,
 ):
     """Load a pretrained model and tokenizer.
 
+    MLM models are only used for inference, so the most recently loaded
+    MLM model & tokenizer are cached and reused by repeated calls with
+    the same arguments. Classification models are fine-tuned, so they
+    are always loaded fresh.
+
     Args:
         model_path (str): Path to the pretrained model.
         task (str): The task, which determines the model type to load.
+        tokenizer_path (str, optional): Path to the tokenizer, if different
+            from `model_path`.
+        torch_dtype (torch.dtype or str, optional): dtype to load the model
+            weights in (eg. `torch.float32`, "float32" or "auto"). If not provided,
+            MLM models are loaded in bfloat16 on GPUs that support it (they are
+            only used for inference), and all other models are loaded in the
+            `from_pretrained` default (float32). Note that MLM outputs (losses,
+            perplexities & predictions) computed in bfloat16 can differ slightly
+            from float32 results.
         kwargs: Any arguments passed here will be passed to the models
             `from_pretrained` function during loading.
 
     Raises:
-        ValueError: If task is not "mlm" or "classification".
+        ValueError: If task is not "mlm" or "classification", or if
+            `torch_dtype` is not a valid torch dtype name.
 
     Returns:
         model: The loaded model.
         tokenizer: The loaded tokenizer.
     """
 
+    if isinstance(torch_dtype, str) and torch_dtype != "auto":
+        torch_dtype = _resolve_dtype(torch_dtype)
+    if torch_dtype is None and task == "mlm" and _bf16_supported():
+        torch_dtype = torch.bfloat16
+    if torch_dtype is not None:
+        kwargs["torch_dtype"] = torch_dtype
+
+    if task == "mlm":
+        kwargs_key = tuple(sorted(kwargs.items()))
+        try:
+            hash(kwargs_key)
+        except TypeError:  # unhashable kwargs can't be cached
+            return _load_model_and_tokenizer(
+                model_path, task, tokenizer_path, **kwargs
+            )
+        return _load_cached_model_and_tokenizer(
+            model_path, task, tokenizer_path, kwargs_key
+        )
+
+    return _load_model_and_tokenizer(model_path, task, tokenizer_path, **kwargs)
+
+
+def clear_model_cache():
+    """Release any cached MLM model & tokenizer."""
+    _load_cached_model_and_tokenizer.cache_clear()
+
+
+def _resolve_dtype(name: str) -> torch.dtype:
+    dtype = getattr(torch, name, None)
+    if not isinstance(dtype, torch.dtype):
+        valid = sorted(
+            n for n in dir(torch) if isinstance(getattr(torch, n, None), torch.dtype)
+        )
+        raise ValueError(
+            f"Unsupported torch_dtype: {name!r}. Must be 'auto' or one of: {valid}"
+        )
+    return dtype
+
+
+def _bf16_supported():
+    return torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+
+
+@lru_cache(maxsize=1)
+def _load_cached_model_and_tokenizer(
+    model_path: str, task: str, tokenizer_path: str | None, kwargs_key: tuple
+):
+    return _load_model_and_tokenizer(
+        model_path, task, tokenizer_path, **dict(kwargs_key)
+    )
+
+
+def _load_model_and_tokenizer(
+    model_path: str, task: str, tokenizer_path: str | None = None, **kwargs
+):
     tokenizer = AutoTokenizer.from_pretrained(tokenizer_path or model_path)
 
     if task == "mlm":
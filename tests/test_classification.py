@@ -1,2 +1,14 @@
+import pytest
+
 from ablm_eval import ClassificationConfig, evaluate_ablms
 from .utils import mini_models
+
+
+def test_classification_config_rejects_torch_dtype():
+    with pytest.raises(ValueError, match="torch_dtype"):
+        ClassificationConfig(
+            dataset_dir="data",
+            file_prefix="hd-0_cov-1",
+            dataset_name="test",
+            torch_dtype="float32",
+        )
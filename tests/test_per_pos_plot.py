@@ -0,0 +1,201 @@
+import random
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from ablm_eval.tasks.per_position_inference.per_position_plot import (
+    REGIONS,
+    _extract,
+    _per_pos_boxenplot,
+    _region_processing,
+    _summary_df,
+)
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+SEPARATOR = "<cls>"
+
+
+def _cdr_mask(rng, n_regions=len(REGIONS)):
+    lengths = [rng.randint(3, 8) for _ in range(n_regions)]
+    return "".join(("F" if i % 2 == 0 else "C") * l for i, l in enumerate(lengths))
+
+
+def _mutate(rng, seq):
+    return [rng.choice(AMINO_ACIDS) if rng.random() < 0.3 else aa for aa in seq]
+
+
+def _results_df(n=30, seed=0, separator=SEPARATOR):
+    # models are deliberately not in sorted order
+    rng = random.Random(seed)
+    seplen = separator.count("<")
+    rows = []
+    for i in range(n):
+        mask_heavy = _cdr_mask(rng, 5 if i == 3 else len(REGIONS))  # w/o 6 CDRs
+        mask_light = _cdr_mask(rng)
+        heavy = "".join(rng.choice(AMINO_ACIDS) for _ in mask_heavy)
+        light = "".join(rng.choice(AMINO_ACIDS) for _ in mask_light)
+        length = len(heavy) + seplen + len(light)
+        rows.append(
+            {
+                "model": ["m2", "m3", "m1"][i % 3],
+                "separator": separator,
+                "sequence": heavy + separator + light,
+                "cdr_mask_heavy": mask_heavy,
+                "cdr_mask_light": mask_light,
+                "v_mutation_count_aa_heavy": i % 4,
+                "v_mutation_count_aa_light": int(i % 5 == 0),
+                "loss": np.random.RandomState(i).rand(length),
+                "prediction": np.array(
+                    _mutate(rng, heavy) + [separator] * seplen + _mutate(rng, light),
+                    dtype=object,
+                ),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def _rowwise_region_stats(df):
+    # reference (row-wise) implementation of the region stats
+    data = []
+    for _, r in df.iterrows():
+        hlen = len(r["cdr_mask_heavy"])
+        sep = r["separator"]
+        lstart = hlen + sep.count("<")
+        chains = {
+            "heavy": (r["loss"][:hlen], r["prediction"][:hlen]),
+            "light": (r["loss"][lstart:], r["prediction"][lstart:]),
+        }
+        seqs = dict(zip(["heavy", "light"], r["sequence"].split(sep)))
+        for chain, (loss, pred) in chains.items():
+            cdr_mask = r[f"cdr_mask_{chain}"]
+            if min(len(loss), len(pred)) < len(cdr_mask):
+                continue
+
+            segments = []
+            start = 0
+            for i in range(1, len(cdr_mask) + 1):
+                if i == len(cdr_mask) or cdr_mask[i] != cdr_mask[i - 1]:
+                    segments.append((start, i))
+                    start = i
+            if len(segments) != len(REGIONS):
+                continue
+
+            for region, (start, end) in zip(REGIONS, segments):
+                data.append(
+                    {
+                        "region": region,
+                        "model": r["model"],
+                        "chain": chain,
+                        "mutated": bool(
+                            r["v_mutation_count_aa_heavy"]
+                            or r["v_mutation_count_aa_light"]
+                        ),
+                        "mean_loss": np.mean(loss[start:end]),
+                        "median_loss": np.median(loss[start:end]),
+                        "accuracy": np.mean(
+                            [
+                                p == t
+                                for p, t in zip(
+                                    pred[start:end], seqs[chain][start:end]
+                                )
+                            ]
+                        ),
+                    }
+                )
+    return pd.DataFrame(data)
+
+
+def _sorted(df):
+    columns = ["model", "chain", "mutated", "mean_loss"]
+    df = df.astype({"model": str, "chain": str, "region": str})
+    return df.sort_values(columns).reset_index(drop=True)
+
+
+def _assert_stats_equal(actual, expected):
+    actual, expected = _sorted(actual), _sorted(expected)
+    assert len(actual) == len(expected)
+    for col in ["region", "model", "chain", "mutated"]:
+        assert (actual[col] == expected[col]).all(), col
+    for col in ["mean_loss", "median_loss", "accuracy"]:
+        np.testing.assert_allclose(actual[col], expected[col], err_msg=col)
+
+
+def test_region_processing_matches_rowwise():
+    df = _results_df()
+    data_df = _region_processing(_extract(df.copy()))
+    _assert_stats_equal(data_df, _rowwise_region_stats(df))
+
+
+@pytest.mark.parametrize("separator", ["[SEP]", "<|sep|>", "<cls>.*"])
+def test_extract_separator_is_not_a_regex(separator):
+    df = _results_df(separator=separator)
+    extracted = _extract(df.copy())
+    for seq, heavy, light in zip(
+        df["sequence"], extracted["heavy_sequence"], extracted["light_sequence"]
+    ):
+        assert [heavy, light] == seq.split(separator)
+
+    data_df = _region_processing(extracted)
+    _assert_stats_equal(data_df, _rowwise_region_stats(df))
+
+
+def test_region_processing_skips_truncated_sequences():
+    df = _results_df()
+    hlen = len(df.at[1, "cdr_mask_heavy"])
+    # light chain truncated
+    df.at[1, "loss"] = df.at[1, "loss"][:-5]
+    df.at[1, "prediction"] = df.at[1, "prediction"][:-5]
+    # truncated within the heavy chain
+    df.at[2, "loss"] = df.at[2, "loss"][: hlen // 2]
+    df.at[2, "prediction"] = df.at[2, "prediction"][: hlen // 2]
+
+    data_df = _region_processing(_extract(df.copy()))
+    expected = _rowwise_region_stats(df)
+    _assert_stats_equal(data_df, expected)
+    assert len(expected) == len(_rowwise_region_stats(_results_df())) - 3 * len(
+        REGIONS
+    )
+
+
+def test_summary_df_matches_rowwise():
+    df = _results_df(n=60)
+    summary = _summary_df(_region_processing(_extract(df.copy())))
+
+    cdr3 = _rowwise_region_stats(df)
+    cdr3 = cdr3[(cdr3["region"] == "CDR3") & (cdr3["chain"] == "heavy")]
+    grouped = cdr3.groupby(["model", "mutated"])[["median_loss", "accuracy"]]
+    medians, sems = grouped.median(), grouped.sem()
+    for (model, mutated), row in summary.set_index(["model", "mutated"]).iterrows():
+        for col in ["median_loss", "accuracy"]:
+            median, sem = medians.loc[(model, mutated), col], sems.loc[(model, mutated), col]
+            expected = f"{median:.4f} (± {sem:.4f})" if pd.notna(sem) else f"{median:.4f}"
+            assert row[f"CDRH3_{col}"] == expected
+    assert list(summary["model"]) == sorted(summary["model"])
+
+
+@pytest.mark.parametrize("y_axis", ["median_loss", "accuracy"])
+def test_boxenplot_model_order(y_axis):
+    df = _results_df(n=60)
+    data_df = _region_processing(_extract(df.copy()))
+    chain_dfs = dict(tuple(data_df.groupby("chain", observed=True)))
+    model_order = sorted(data_df["model"].unique())
+
+    fig = _per_pos_boxenplot(chain_dfs, model_order, y_axis=y_axis)
+
+    # median lines are drawn left to right, by region then model
+    for ax, chain in zip(fig.axes, ["heavy", "light"]):
+        expected = (
+            chain_dfs[chain]
+            .groupby(["region", "model"], observed=True)[y_axis]
+            .median()
+            .loc[[(r, m) for r in REGIONS for m in model_order]]
+        )
+        drawn = [line.get_ydata()[0] for line in ax.lines]
+        np.testing.assert_allclose(drawn, expected.values)
+    plt.close(fig)
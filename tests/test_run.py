@@ -1,3 +1,7 @@
+from types import SimpleNamespace
+
+import ablm_eval.run as run_module
+
 # check compare_results fn
 # check compare-task fn
 
@@ -5,3 +9,28 @@
 # temporary test github actions
 def test_basic():
     assert 1 + 1 == 2
+
+
+def test_eval_model_clears_cached_model_before_non_mlm_tasks(monkeypatch):
+    events = []
+    monkeypatch.setattr(run_module, "clear_model_cache", lambda: events.append("clear"))
+    monkeypatch.setattr(run_module, "_clean_up", lambda: None)
+
+    def config(task_type):
+        return SimpleNamespace(
+            config_type=task_type,
+            name=task_type,
+            runner=lambda *args: events.append(task_type),
+        )
+
+    tasks = ["inference", "per_pos_inference", "classification", "routing_analysis"]
+    run_module._eval_model("model", "/path/to/model", [config(t) for t in tasks])
+
+    assert events == [
+        "inference",
+        "per_pos_inference",
+        "clear",
+        "classification",
+        "routing_analysis",
+        "clear",
+    ]